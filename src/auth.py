@@ -55,12 +55,17 @@ def _ensure_env_loaded() -> None:
     setup_env()
 
 
-def _get_data_dir() -> Path:
-    """Return DATA_DIR as parent of DATABASE_PATH."""
+def get_data_dir() -> Path:
+    """Return DATA_DIR as parent of DATABASE_PATH (also used for other local state files)."""
     db_path = os.getenv("DATABASE_PATH", "./data/stock_analysis.db")
     return Path(db_path).resolve().parent
 
 
+def _get_data_dir() -> Path:
+    """Data dir lookup used by this module's credential and secret files."""
+    return get_data_dir()
+
+
 def _get_credential_path() -> Path:
     """Path to stored password hash file."""
     return _get_data_dir() / ".admin_password_hash"
@@ -1,43 +1,410 @@
 # feishu_doc.py
 # -*- coding: utf-8 -*-
-import logging
-import json
+import asyncio
+import contextlib
 import datetime
-import requests
-import lark_oapi as lark
-from lark_oapi.api.docx.v1 import *
-from typing import List, Dict, Any, Optional
+import hashlib
+import importlib.util
+import io
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from enum import Enum
+from itertools import islice
+from typing import Any, AsyncIterator, Callable, Dict, Generator, Iterable, Iterator, List, Optional, Tuple
+
+import httpx
+
+from src.auth import get_data_dir
 
 # 读取配置（确保和你的config.py适配）
-from src.config import config  # 若你的config是函数，替换为：from src.config import get_config; config = get_config()
+from src.config import get_config
 
 # 初始化日志
 logger = logging.getLogger(__name__)
-logging.basicConfig(level=logging.INFO)
+
+
+# Feishu Open API base URL
+_FEISHU_API_BASE = "https://open.feishu.cn/open-apis"
+
+# Timeouts (connect, read): a short connect timeout fails fast on unreachable hosts and leaves it to the retry policy
+_HTTP_TIMEOUT = httpx.Timeout(10.0, connect=3.05)
+
+# Default headers for the sync and async clients (gzip responses, JSON bodies)
+_DEFAULT_HEADERS = {"Accept-Encoding": "gzip", "Content-Type": "application/json; charset=utf-8"}
+
+# Only 429 (request rejected by rate limiting) is retried, with exponential backoff (Retry-After first);
+# failed connects are retried by the transport. A 5xx is as ambiguous as a read timeout: the write
+# (document, blocks, push) may already have been applied, so it is not re-sent
+_RETRY_STATUS = frozenset((429,))
+_MAX_RETRIES = 3
+# Longest wait worth blocking the caller for; a larger Retry-After gives up instead
+_MAX_RETRY_DELAY = 30.0
+
+# HTTP/2 needs h2 (httpx[http2]); fall back to HTTP/1.1 when it is missing
+_HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+# Local tenant_access_token cache (valid for about 2 hours, treated as expired 5 minutes early)
+_TOKEN_CACHE_FILE = ".feishu_token_cache.json"
+_TOKEN_SAFETY_MARGIN = 300
+
+# Open API codes meaning the tenant token was rejected (revoked, or the app secret rotated)
+_INVALID_TOKEN_CODES = frozenset((99991663, 99991665))
+
+# Serializes read-modify-write of the local JSON cache files
+_CACHE_LOCK = threading.Lock()
+
+# Created-document cache: sha256(title + content) -> document URL; repeat calls within 24 hours return it directly
+_DOC_CACHE_FILE = ".feishu_doc_cache.json"
+_DOC_CACHE_TTL = 86400
+
+# Cap on in-flight Open API requests (Feishu rate-limits per app)
+_MAX_INFLIGHT_REQUESTS = 5
+
+# The descendant-insert API accepts at most 1000 blocks per call
+_MAX_DESCENDANTS = 1000
+
+# Background pool for bot pushes (the interpreter waits for submitted pushes before exiting)
+_PUSH_POOL = ThreadPoolExecutor(max_workers=2, thread_name_prefix="feishu-push")
+
+# Bot push message body: the static part is pre-serialized; only title, URL and timestamp are filled in per push
+_PUSH_MSG_TEMPLATE = json.dumps({
+    "msg_type": "markdown",
+    "content": {
+        "title": "📋 操盘日报已生成",
+        "text": "\n### %s\n"
+                "✅ 今日中线操盘复盘文档已创建完成，点击查看详情：\n"
+                "[📄 查看完整复盘文档](%s)\n"
+                "---\n"
+                "> 生成时间：%s\n"
+                "> 数据来源：TrendRadar 财经雷达\n",
+    },
+}, ensure_ascii=False).encode("utf-8")
+
+# Markdown line patterns; heading level -> Feishu block type (3=H1, 4=H2, 5=H3)
+_HEADING_RE = re.compile(r'^(#{1,3})\s+(.*)$')
+_DIVIDER_RE = re.compile(r'^-{3,}$')
+_HEAD_TYPE = {1: 3, 2: 4, 3: 5}
+
+# Block type -> the field that carries its text in the API payload
+_BLOCK_KEY = {2: "text", 3: "heading1", 4: "heading2", 5: "heading3"}
+
+# Step generator: yields (Open API path, JSON payload), receives the JSON result, returns its outcome
+_Steps = Generator[Tuple[str, Dict[str, Any]], Dict[str, Any], Any]
+
+
+class _WriteStatus(Enum):
+    """Outcome of writing the report content into a document."""
+    NOTHING = "nothing"  # nothing written; safe to fall back to another writer
+    PARTIAL = "partial"  # some batches written, then a failure
+    COMPLETE = "complete"
+
+
+def _make_text_block(block_type: int, text: str) -> Dict[str, Any]:
+    """Build a text/heading block as the API's JSON structure."""
+    return {
+        "block_type": block_type,
+        _BLOCK_KEY[block_type]: {
+            "elements": [{"text_run": {"content": text, "text_element_style": {}}}],
+            "style": {},
+        },
+    }
+
+
+def _json_escape(value: str) -> bytes:
+    """Escape a string into UTF-8 bytes that can be embedded in a JSON string literal."""
+    return json.dumps(value, ensure_ascii=False)[1:-1].encode("utf-8")
+
+
+def _group_descendants(first_level_ids: List[str], blocks: List[Dict[str, Any]],
+                       max_size: int) -> Optional[List[Tuple[List[str], List[Dict[str, Any]]]]]:
+    """
+    Split the converted block tree on first-level blocks into groups of at most max_size blocks each
+    (a first-level block always travels with its whole subtree)
+    :param first_level_ids: first-level block IDs, in document order
+    :param blocks: all blocks (first-level blocks and their descendants)
+    :param max_size: maximum number of blocks per insert call
+    :return: [(first-level block IDs, all blocks of the group)]; None when a single subtree exceeds the limit
+    """
+    if len(blocks) <= max_size:
+        return [(first_level_ids, blocks)]
+
+    by_id = {block.get("block_id"): block for block in blocks}
+    groups: List[Tuple[List[str], List[Dict[str, Any]]]] = []
+    group_ids: List[str] = []
+    group_blocks: List[Dict[str, Any]] = []
+
+    for block_id in first_level_ids:
+        # Collect the whole subtree of this first-level block
+        subtree = []
+        stack = [block_id]
+        while stack:
+            block = by_id.get(stack.pop())
+            if block is None:
+                continue
+            subtree.append(block)
+            stack.extend(reversed(block.get("children") or []))
+
+        if len(subtree) > max_size:
+            return None
+        if group_blocks and len(group_blocks) + len(subtree) > max_size:
+            groups.append((group_ids, group_blocks))
+            group_ids, group_blocks = [], []
+        group_ids.append(block_id)
+        group_blocks.extend(subtree)
+
+    if group_ids:
+        groups.append((group_ids, group_blocks))
+    return groups
+
+
+def _descendant_groups(data: Dict[str, Any]) -> Optional[List[Tuple[List[str], List[Dict[str, Any]]]]]:
+    """
+    Turn the Markdown convert API's data into insertable groups (see _group_descendants)
+    :param data: the data field of the convert response
+    """
+    blocks = data.get("blocks") or []
+    for block in blocks:
+        # Table merge_info in the converted blocks is read-only and must be removed before inserting
+        table = block.get("table") or {}
+        (table.get("property") or {}).pop("merge_info", None)
+    return _group_descendants(data.get("first_level_block_ids") or [], blocks, _MAX_DESCENDANTS)
+
+
+def _build_push_body(title: str, doc_url: str) -> bytes:
+    """Build the bot push body (JSON-escaped values filled into the pre-serialized template)."""
+    return _PUSH_MSG_TEMPLATE % (
+        _json_escape(title),
+        _json_escape(doc_url),
+        datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S').encode("utf-8"),
+    )
+
+
+def _doc_cache_key(title: str, content_md: str) -> str:
+    """Key of the created-document cache (sha256 of title and content)."""
+    return hashlib.sha256((title + "\x00" + content_md).encode("utf-8")).hexdigest()
+
+
+def _load_json_cache(name: str) -> Dict[str, Any]:
+    """Read a local JSON cache file; an empty dict when it is missing or corrupt."""
+    try:
+        with open(get_data_dir() / name, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_json_cache(name: str, data: Dict[str, Any]) -> None:
+    """
+    Write a local JSON cache file: the temp file is created 0600 from the start
+    (it may hold a token) and then atomically swapped into place.
+    """
+    cache_dir = get_data_dir()
+    path = cache_dir / name
+    tmp_path = path.with_name(f"{name}.{os.getpid()}.tmp")
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path.unlink(missing_ok=True)
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning("写入本地缓存失败（%s）：%s", name, e)
+
+
+def _update_json_cache(name: str, update: Callable[[Dict[str, Any]], None]) -> None:
+    """
+    Load, modify and save a local JSON cache under a lock, so concurrent writers
+    (threads, or asyncio.gather via to_thread) do not drop each other's entries.
+    :param name: cache file name
+    :param update: callback mutating the loaded dict in place
+    """
+    with _CACHE_LOCK:
+        data = _load_json_cache(name)
+        update(data)
+        _save_json_cache(name, data)
+
+
+def _openapi_result(response: httpx.Response) -> Dict[str, Any]:
+    """
+    JSON result of an Open API call. A 5xx or a non-JSON body leaves the outcome unknown
+    (the write may have been applied) and is reported as code None.
+    """
+    if response.status_code >= 500:
+        return {"code": None, "msg": f"HTTP {response.status_code}"}
+    try:
+        result = response.json()
+    except ValueError:
+        result = None
+    if not isinstance(result, dict):
+        return {"code": None, "msg": f"HTTP {response.status_code}: non-JSON response"}
+    return result
+
+
+def _retry_plan(response: httpx.Response, attempt: int) -> Optional[float]:
+    """
+    Decide whether to retry a response: returns the delay in seconds, or None to stop.
+    :param response: the response just received
+    :param attempt: retries done so far (from 0)
+    """
+    if response.status_code not in _RETRY_STATUS or attempt >= _MAX_RETRIES:
+        return None
+    delay = _retry_delay(response, attempt)
+    if delay > _MAX_RETRY_DELAY:
+        logger.warning("飞书接口返回%s，要求等待%.0f秒，超过上限，放弃重试", response.status_code, delay)
+        return None
+    logger.warning("飞书接口返回%s，%.1f秒后重试（第%s次）", response.status_code, delay, attempt + 1)
+    return delay
+
+
+def _log_push_response(response: httpx.Response) -> None:
+    """Log the outcome of a bot webhook push."""
+    response.raise_for_status()  # 抛出HTTP异常
+    result = response.json()
+    if result.get("code") == 0:
+        logger.info("文档链接推送至飞书群成功")
+    else:
+        logger.error("推送失败：飞书返回错误 - %s", result)
+
+
+def _log_push_error(error: Exception) -> None:
+    """Log an exception raised while pushing to the bot webhook."""
+    if isinstance(error, httpx.TimeoutException):
+        logger.error("推送超时：飞书机器人服务未响应")
+    elif isinstance(error, httpx.ConnectError):
+        logger.error("推送失败：无法连接到飞书机器人")
+    else:
+        logger.error("推送异常：%s", error, exc_info=error)
+
+
+def _retry_delay(response: httpx.Response, attempt: int, base: float = 1.0) -> float:
+    """
+    Delay before the next retry: Retry-After (seconds) when present, otherwise exponential backoff with jitter
+    :param response: the response being retried
+    :param attempt: retries done so far (from 0)
+    :param base: backoff base (seconds)
+    """
+    retry_after = response.headers.get("Retry-After", "")
+    if retry_after.isdigit():
+        return float(retry_after)
+    return base * 2 ** attempt * (1 + random.random() * 0.5)
+
 
 class FeishuDocManager:
     """飞书云文档管理器 + 机器人推送（整合版）"""
     def __init__(self):
         # 从配置文件读取飞书参数
+        config = get_config()
         self.app_id = config.feishu_app_id
         self.app_secret = config.feishu_app_secret
         self.folder_token = config.feishu_folder_token
-        self.bot_webhook = config.feishu_bot_webhook
-
-        # 初始化飞书SDK客户端（自动处理token）
-        if self.is_configured():
-            self.client = lark.Client.builder() \
-                .app_id(self.app_id) \
-                .app_secret(self.app_secret) \
-                .log_level(lark.LogLevel.INFO) \
-                .build()
-        else:
-            self.client = None
-            logger.warning("飞书配置不完整，SDK客户端未初始化")
+        self.bot_webhook = getattr(config, "feishu_bot_webhook", None)
+        # Whether the config needed to create documents is complete (fixed for the instance lifetime, computed once)
+        self._ready = bool(self.app_id and self.app_secret and self.folder_token)
+
+        # Keep-alive pool: the Open API and the bot webhook are fixed hosts, so TCP/TLS handshakes are reused;
+        # concurrent requests share one connection under HTTP/2, and responses are gzip-compressed
+        self.http_client = httpx.Client(
+            transport=httpx.HTTPTransport(
+                limits=httpx.Limits(max_connections=10, max_keepalive_connections=4),
+                http2=_HTTP2_AVAILABLE,
+                retries=_MAX_RETRIES,  # retry failed connects
+            ),
+            headers=_DEFAULT_HEADERS,
+            timeout=_HTTP_TIMEOUT,
+        )
+
+        # Limit in-flight Open API requests so bursts do not hit Feishu rate limiting (429) and trigger retry storms
+        self._sem = threading.Semaphore(_MAX_INFLIGHT_REQUESTS)
+        self._async_sem: Optional[asyncio.Semaphore] = None
+        self._async_sem_loop: Optional[asyncio.AbstractEventLoop] = None
+        # Event loop -> (AsyncClient, number of create_daily_doc_async calls using it)
+        self._async_clients: Dict[asyncio.AbstractEventLoop, Tuple[httpx.AsyncClient, int]] = {}
+
+        # tenant_access_token is fetched here and cached on disk across processes, saving an auth call per start
+        self._token: Optional[str] = None
+        self._token_exp_ts = 0.0
+
+        if not self._ready:
+            logger.warning("飞书配置不完整，无法创建文档")
 
     def is_configured(self) -> bool:
         """检查创建文档的核心配置是否完整"""
-        return bool(self.app_id and self.app_secret and self.folder_token)
+        return self._ready
+
+    def _get_tenant_access_token(self) -> Optional[str]:
+        """
+        Get the tenant_access_token: memory -> local cache -> auth API
+        :return: the token (None on failure)
+        """
+        now = time.time()
+        if self._token and self._token_exp_ts > now:
+            return self._token
+
+        cache = _load_json_cache(_TOKEN_CACHE_FILE)
+        entry = cache.get(self.app_id)
+        if isinstance(entry, dict) and entry.get("token") and entry.get("exp_ts", 0) > now:
+            self._token, self._token_exp_ts = entry["token"], entry["exp_ts"]
+            return self._token
+
+        try:
+            response = self._post(
+                f"{_FEISHU_API_BASE}/auth/v3/tenant_access_token/internal",
+                json={"app_id": self.app_id, "app_secret": self.app_secret}
+            )
+            response.raise_for_status()
+            result = response.json()
+        except Exception as e:
+            logger.error("获取tenant_access_token异常：%s", e)
+            return None
+
+        if result.get("code") != 0:
+            logger.error("获取tenant_access_token失败：%s - %s", result.get('code'), result.get('msg'))
+            return None
+
+        self._token = result["tenant_access_token"]
+        self._token_exp_ts = now + result.get("expire", 7200) - _TOKEN_SAFETY_MARGIN
+        entry = {"token": self._token, "exp_ts": self._token_exp_ts}
+        _update_json_cache(_TOKEN_CACHE_FILE, lambda cache: cache.__setitem__(self.app_id, entry))
+        return self._token
+
+    def _require_token(self) -> str:
+        """Return a valid tenant_access_token, raising instead of sending an empty/None bearer."""
+        token = self._get_tenant_access_token()
+        if not token:
+            raise RuntimeError("获取飞书tenant_access_token失败")
+        return token
+
+    def _invalidate_token(self) -> None:
+        """Drop the cached token from memory and from the local cache file."""
+        self._token, self._token_exp_ts = None, 0.0
+        _update_json_cache(_TOKEN_CACHE_FILE, lambda cache: cache.pop(self.app_id, None))
+
+    def _get_cached_doc_url(self, cache_key: str) -> Optional[str]:
+        """Look up the created-document cache (the document URL while not expired)."""
+        entry = _load_json_cache(_DOC_CACHE_FILE).get(cache_key)
+        if isinstance(entry, dict) and entry.get("exp_ts", 0) > time.time():
+            return entry.get("url")
+        return None
+
+    def _cache_doc_url(self, cache_key: str, doc_url: str) -> None:
+        """Remember a fully written document's URL, pruning expired entries."""
+        now = time.time()
+
+        def update(cache: Dict[str, Any]) -> None:
+            expired = [k for k, entry in cache.items() if not isinstance(entry, dict) or entry.get("exp_ts", 0) <= now]
+            for key in expired:
+                del cache[key]
+            cache[cache_key] = {"url": doc_url, "exp_ts": now + _DOC_CACHE_TTL}
+
+        _update_json_cache(_DOC_CACHE_FILE, update)
 
     def create_daily_doc(self, title: str, content_md: str) -> Optional[str]:
         """
@@ -47,128 +414,308 @@ class FeishuDocManager:
         :return: 文档链接（失败返回None）
         """
         # 1. 前置检查
-        if not self.client or not self.is_configured():
-            logger.error("飞书SDK未初始化，无法创建文档")
+        if not self._ready:
+            logger.error("飞书配置不完整，无法创建文档")
             return None
 
+        # Same title + content already created (e.g. a retry after a downstream failure):
+        # return the existing document without creating or pushing again
+        cache_key = _doc_cache_key(title, content_md)
+        cached_url = self._get_cached_doc_url(cache_key)
+        if cached_url:
+            logger.info("相同内容的文档已创建，跳过创建与推送：%s", cached_url)
+            return cached_url
+
         try:
-            # 2. 创建空文档
-            create_request = CreateDocumentRequest.builder() \
-                .request_body(CreateDocumentRequestBody.builder()
-                              .folder_token(self.folder_token)
-                              .title(title)
-                              .build()) \
-                .build()
-            response = self.client.docx.v1.document.create(create_request)
-            
-            if not response.success():
-                logger.error(f"创建空文档失败：{response.code} - {response.msg}")
+            # 2. Create the document and write the content; incomplete documents are neither cached nor pushed
+            doc_url = self._run_steps(self._create_doc_steps(title, content_md))
+            if not doc_url:
                 return None
+            self._cache_doc_url(cache_key, doc_url)
 
-            # 3. 获取文档ID和链接
-            doc_id = response.data.document.document_id
-            doc_url = f"https://feishu.cn/docx/{doc_id}"
-            logger.info(f"空文档创建成功，链接：{doc_url}")
-
-            # 4. 转换Markdown为飞书Block并写入
-            blocks = self._markdown_to_sdk_blocks(content_md)
-            self._batch_write_blocks(doc_id, blocks)
-            logger.info("文档内容写入完成")
-
-            # 5. 推送文档链接到飞书群（核心新增逻辑）
+            # 3. Push the link from a background thread so the caller is not blocked; failures are only logged
             if self.bot_webhook:
-                self._send_doc_link_to_feishu(title, doc_url)
+                _PUSH_POOL.submit(self._send_doc_link_to_feishu, title, doc_url)
             else:
                 logger.warning("飞书机器人Webhook未配置，跳过推送")
 
             return doc_url
 
         except Exception as e:
-            logger.error(f"创建/推送文档异常：{str(e)}", exc_info=True)
+            logger.error("创建/推送文档异常：%s", e, exc_info=True)
+            return None
+
+    # ------------------- Content writing (shared by the sync and async paths) -------------------
+    # The step generators below hold all decision logic. They yield (Open API path, payload)
+    # requests and receive the JSON results; _run_steps / _arun_steps only perform the I/O.
+
+    def _create_doc_steps(self, title: str, content_md: str) -> _Steps:
+        """
+        Create an empty document in the configured folder, then write the report into it.
+        :return (generator result): document URL, or None when creation failed or the write is incomplete
+        """
+        result = yield "/docx/v1/documents", {"folder_token": self.folder_token, "title": title}
+        if result.get("code") != 0:
+            logger.error("创建空文档失败：%s - %s", result.get('code'), result.get('msg'))
+            return None
+
+        doc_id = result["data"]["document"]["document_id"]
+        doc_url = f"https://feishu.cn/docx/{doc_id}"
+        logger.info("空文档创建成功，链接：%s", doc_url)
+
+        if not (yield from self._content_write_steps(doc_id, content_md)):
+            logger.error("文档内容写入不完整，跳过缓存与推送：%s", doc_url)
             return None
+        logger.info("文档内容写入完成")
+        return doc_url
+
+    def _content_write_steps(self, doc_id: str, content_md: str) -> _Steps:
+        """
+        Write the report: server-side Markdown conversion first, falling back to the local
+        line-by-line conversion only when nothing has been written yet.
+        :return (generator result): whether the whole content was written
+        """
+        status = yield from self._native_write_steps(doc_id, content_md)
+        if status is not _WriteStatus.NOTHING:
+            return status is _WriteStatus.COMPLETE
+
+        logger.warning("飞书Markdown转换接口写入失败，回退为本地逐行转换")
+        return (yield from self._batch_write_steps(doc_id, self._iter_markdown_blocks(content_md)))
+
+    def _native_write_steps(self, doc_id: str, content_md: str) -> _Steps:
+        """
+        Convert Markdown server-side and insert the block tree (including nested blocks).
+        A single call when within the per-call limit; otherwise split on first-level blocks
+        and written in order, each call inserting right after the previous call's root children.
+        :param doc_id: document ID (the root block ID equals the document ID)
+        :param content_md: Markdown content
+        :return (generator result): NOTHING when nothing was written (safe to fall back), PARTIAL or COMPLETE
+        """
+        result = yield "/docx/v1/documents/blocks/convert", {"content_type": "markdown", "content": content_md}
+        if result.get("code") != 0:
+            logger.warning("Markdown转换失败：%s - %s", result.get('code'), result.get('msg'))
+            return _WriteStatus.NOTHING
+
+        groups = _descendant_groups(result.get("data") or {})
+        if groups is None:
+            logger.warning("单个一级块的子块数量超过%s，无法通过转换接口写入", _MAX_DESCENDANTS)
+            return _WriteStatus.NOTHING
+
+        index = 0  # the new document is empty, so writing starts at 0
+        for group_no, (children_id, descendants) in enumerate(groups, start=1):
+            result = yield (
+                f"/docx/v1/documents/{doc_id}/blocks/{doc_id}/descendant",
+                {"children_id": children_id, "descendants": descendants, "index": index},
+            )
+            if result.get("code") != 0:
+                logger.warning("插入转换后的Block失败（批次%s）：%s - %s", group_no, result.get('code'), result.get('msg'))
+                # Only an explicit rejection of the first call proves nothing was written; after a
+                # timeout or an unknown result the insert may have been applied, so no fallback
+                if group_no == 1 and result.get("code") is not None:
+                    return _WriteStatus.NOTHING
+                logger.error("文档内容未完整写入（%s/%s批已确认）", group_no - 1, len(groups))
+                return _WriteStatus.PARTIAL
+
+            # data.children lists every created block, nested ones included; the root gained exactly these
+            index += len(children_id)
+
+        return _WriteStatus.COMPLETE
+
+    def _batch_write_steps(self, doc_id: str, blocks: Iterable[Dict[str, Any]]) -> _Steps:
+        """
+        Append blocks to the document in batches, in order.
+        Appends under one parent depend on each other (index may not exceed the current
+        child count), so batches are written sequentially rather than in parallel.
+        :return (generator result): whether every batch was written
+        """
+        batch_size = 50  # 飞书API限制单次写入数量
+        blocks = iter(blocks)
+        failed = []
+        batch_no = 0
+
+        while True:
+            batch_blocks = list(islice(blocks, batch_size))
+            if not batch_blocks:
+                break
+            batch_no += 1
+            result = yield (
+                f"/docx/v1/documents/{doc_id}/blocks/{doc_id}/children",
+                {"children": batch_blocks, "index": -1},  # -1 = append to the end
+            )
+            if result.get("code") != 0:
+                logger.error("写入Block失败（批次%s）：%s - %s", batch_no, result.get('code'), result.get('msg'))
+                failed.append(batch_no)
+
+        if failed:
+            logger.error("共%s个批次写入失败：%s", len(failed), failed)
+        return not failed
+
+    def _run_steps(self, steps: _Steps) -> Any:
+        """
+        Drive a step generator with blocking Open API calls.
+        An exception becomes a result with code None: the outcome of that call is unknown.
+        """
+        try:
+            request = next(steps)
+            while True:
+                try:
+                    result = self._post_openapi(*request)
+                except Exception as e:
+                    logger.warning("飞书接口调用异常：%s", e)
+                    result = {"code": None, "msg": str(e)}
+                request = steps.send(result)
+        except StopIteration as stop:
+            return stop.value
+
+    async def _arun_steps(self, steps: _Steps) -> Any:
+        """Async counterpart of _run_steps."""
+        try:
+            request = next(steps)
+            while True:
+                try:
+                    result = await self._apost_openapi(*request)
+                except Exception as e:
+                    logger.warning("飞书接口调用异常：%s", e)
+                    result = {"code": None, "msg": str(e)}
+                request = steps.send(result)
+        except StopIteration as stop:
+            return stop.value
 
-    def _markdown_to_sdk_blocks(self, md_text: str) -> List[Block]:
-        """Markdown转飞书SDK的Block对象（原有逻辑保留）"""
-        blocks = []
-        lines = md_text.split('\n')
-        
-        for line in lines:
+    def _iter_markdown_blocks(self, md_text: str) -> Iterator[Dict[str, Any]]:
+        """Convert Markdown into Feishu block dicts (generator; one regex match picks the block type)."""
+        # Stream the lines instead of building a list of the whole text
+        for line in io.StringIO(md_text):
             line = line.strip()
             if not line:
                 continue
 
-            # 初始化默认值
-            block_type = 2  # 2=普通文本
-            text_content = line
-
-            # 识别标题
-            if line.startswith('# '):
-                block_type = 3  # 3=H1
-                text_content = line[2:]
-            elif line.startswith('## '):
-                block_type = 4  # 4=H2
-                text_content = line[3:]
-            elif line.startswith('### '):
-                block_type = 5  # 5=H3
-                text_content = line[4:]
-            elif line.startswith('---'):
-                # 分割线（22=Divider）
-                blocks.append(Block.builder()
-                              .block_type(22)
-                              .divider(Divider.builder().build())
-                              .build())
+            # Divider (22 = Divider)
+            if _DIVIDER_RE.match(line):
+                yield {"block_type": 22, "divider": {}}
                 continue
 
-            # 构造文本元素
-            text_run = TextRun.builder() \
-                .content(text_content) \
-                .text_element_style(TextElementStyle.builder().build()) \
-                .build()
-            
-            text_element = TextElement.builder() \
-                .text_run(text_run) \
-                .build()
-            
-            text_obj = Text.builder() \
-                .elements([text_element]) \
-                .style(TextStyle.builder().build()) \
-                .build()
-
-            # 组装Block
-            block_builder = Block.builder().block_type(block_type)
-            if block_type == 2:
-                block_builder.text(text_obj)
-            elif block_type == 3:
-                block_builder.heading1(text_obj)
-            elif block_type == 4:
-                block_builder.heading2(text_obj)
-            elif block_type == 5:
-                block_builder.heading3(text_obj)
-
-            blocks.append(block_builder.build())
-
-        return blocks
-
-    def _batch_write_blocks(self, doc_id: str, blocks: List[Block]):
-        """分批写入Block到文档（原有逻辑保留，优化命名）"""
-        batch_size = 50  # 飞书API限制单次写入数量
-        doc_block_id = doc_id  # 文档根节点ID就是文档ID
-        
-        for i in range(0, len(blocks), batch_size):
-            batch_blocks = blocks[i:i+batch_size]
-            # 构造写入请求
-            add_request = CreateDocumentBlockChildrenRequest.builder() \
-                .document_id(doc_id) \
-                .block_id(doc_block_id) \
-                .request_body(CreateDocumentBlockChildrenRequestBody.builder()
-                              .children(batch_blocks)
-                              .index(-1)  # -1=追加到末尾
-                              .build()) \
-                .build()
-            
-            resp = self.client.docx.v1.document_block_children.create(add_request)
-            if not resp.success():
-                logger.error(f"写入Block失败（批次{i//batch_size+1}）：{resp.code} - {resp.msg}")
+            # Heading, otherwise plain text (2 = Text)
+            match = _HEADING_RE.match(line)
+            if match:
+                yield _make_text_block(_HEAD_TYPE[len(match.group(1))], match.group(2))
+            else:
+                yield _make_text_block(2, line)
+
+    # ------------------- HTTP -------------------
+
+    def _post_openapi(self, path: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Call a Feishu Open API directly (pooled connection, retry policy, in-flight cap).
+        A rejected token is dropped and the call is retried once with a fresh one.
+        :param path: API path (e.g. /docx/v1/documents)
+        :param payload: JSON body
+        :return: the API's JSON result (code=0 means success)
+        """
+        for attempt in range(2):
+            headers = {"Authorization": f"Bearer {self._require_token()}"}
+            with self._sem:
+                response = self._post(f"{_FEISHU_API_BASE}{path}", json=payload, headers=headers)
+            result = _openapi_result(response)
+            if not self._token_rejected(result, attempt):
+                return result
+            self._invalidate_token()
+        return result
+
+    async def _apost_openapi(self, path: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Async counterpart of _post_openapi; blocking token/cache work runs off the event loop."""
+        for attempt in range(2):
+            headers = {"Authorization": f"Bearer {await self._arequire_token()}"}
+            async with self._async_semaphore():
+                response = await self._apost(f"{_FEISHU_API_BASE}{path}", json=payload, headers=headers)
+            result = _openapi_result(response)
+            if not self._token_rejected(result, attempt):
+                return result
+            await asyncio.to_thread(self._invalidate_token)
+        return result
+
+    def _token_rejected(self, result: Dict[str, Any], attempt: int) -> bool:
+        """Whether the result reports an invalid token and the call should be retried with a fresh one."""
+        if result.get("code") not in _INVALID_TOKEN_CODES or attempt > 0:
+            return False
+        logger.warning("飞书tenant_access_token已失效（%s），刷新后重试", result.get("code"))
+        return True
+
+    async def _arequire_token(self) -> str:
+        """Async counterpart of _require_token; only a cache miss leaves the event loop."""
+        if self._token and self._token_exp_ts > time.time():
+            return self._token
+        return await asyncio.to_thread(self._require_token)
+
+    def _post(self, url: str, **kwargs) -> httpx.Response:
+        """
+        POST, retrying 429 with exponential backoff (Retry-After first).
+        5xx responses and read timeouts are not retried: the request may already have been
+        applied, and retrying would duplicate writes/pushes.
+        :param url: request URL
+        :param kwargs: passed through to httpx.Client.post
+        :return: the last response
+        """
+        for attempt in range(_MAX_RETRIES + 1):
+            response = self.http_client.post(url, **kwargs)
+            delay = _retry_plan(response, attempt)
+            if delay is None:
+                return response
+            time.sleep(delay)
+        return response
+
+    async def _apost(self, url: str, **kwargs) -> httpx.Response:
+        """Async counterpart of _post, on the event loop's shared AsyncClient."""
+        http = self._get_async_client()
+        for attempt in range(_MAX_RETRIES + 1):
+            response = await http.post(url, **kwargs)
+            delay = _retry_plan(response, attempt)
+            if delay is None:
+                return response
+            await asyncio.sleep(delay)
+        return response
+
+    def _async_semaphore(self) -> asyncio.Semaphore:
+        """In-flight cap shared within the running event loop (asyncio.Semaphore cannot cross loops)."""
+        loop = asyncio.get_running_loop()
+        if self._async_sem_loop is not loop:
+            self._async_sem = asyncio.Semaphore(_MAX_INFLIGHT_REQUESTS)
+            self._async_sem_loop = loop
+        return self._async_sem
+
+    def _get_async_client(self) -> httpx.AsyncClient:
+        """AsyncClient of the running event loop (only valid inside _async_session)."""
+        return self._async_clients[asyncio.get_running_loop()][0]
+
+    @contextlib.asynccontextmanager
+    async def _async_session(self) -> AsyncIterator[httpx.AsyncClient]:
+        """
+        Share one AsyncClient among the concurrent calls on the running event loop, so documents
+        created together via asyncio.gather share one connection pool. The client is closed when
+        the last call finishes, so no pool outlives its loop (e.g. across asyncio.run calls).
+        """
+        loop = asyncio.get_running_loop()
+        client, users = self._async_clients.get(loop) or (None, 0)
+        if client is None:
+            client = httpx.AsyncClient(
+                transport=httpx.AsyncHTTPTransport(
+                    limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+                    http2=_HTTP2_AVAILABLE,
+                    retries=_MAX_RETRIES,  # retry failed connects
+                ),
+                headers=_DEFAULT_HEADERS,
+                timeout=_HTTP_TIMEOUT,
+            )
+        self._async_clients[loop] = (client, users + 1)
+        try:
+            yield client
+        finally:
+            client, users = self._async_clients.pop(loop)
+            if users > 1:
+                self._async_clients[loop] = (client, users - 1)
+            else:
+                await client.aclose()
+
+    # ------------------- Bot push -------------------
 
     def _send_doc_link_to_feishu(self, title: str, doc_url: str):
         """
@@ -176,47 +723,62 @@ class FeishuDocManager:
         :param title: 文档标题
         :param doc_url: 文档链接
         """
-        # 构造飞书机器人Markdown消息体
-        msg_body = {
-            "msg_type": "markdown",
-            "content": {
-                "title": "📋 操盘日报已生成",
-                "text": f"""
-### {title}
-✅ 今日中线操盘复盘文档已创建完成，点击查看详情：
-[📄 查看完整复盘文档]({doc_url})
----
-> 生成时间：{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
-> 数据来源：TrendRadar 财经雷达
-                """
-            }
-        }
-
         try:
             # 发送POST请求到飞书机器人
-            response = requests.post(
-                url=self.bot_webhook,
-                headers={"Content-Type": "application/json"},
-                data=json.dumps(msg_body),
-                timeout=10  # 超时保护
-            )
-            response.raise_for_status()  # 抛出HTTP异常
-            
-            result = response.json()
-            if result.get("code") == 0:
-                logger.info("文档链接推送至飞书群成功")
-            else:
-                logger.error(f"推送失败：飞书返回错误 - {result}")
+            _log_push_response(self._post(self.bot_webhook, content=_build_push_body(title, doc_url)))
+        except Exception as e:
+            _log_push_error(e)
 
-        except requests.exceptions.Timeout:
-            logger.error("推送超时：飞书机器人服务未响应")
-        except requests.exceptions.ConnectionError:
-            logger.error("推送失败：无法连接到飞书机器人")
+    async def _send_doc_link_async(self, title: str, doc_url: str):
+        """Async counterpart of _send_doc_link_to_feishu."""
+        try:
+            _log_push_response(await self._apost(self.bot_webhook, content=_build_push_body(title, doc_url)))
         except Exception as e:
-            logger.error(f"推送异常：{str(e)}", exc_info=True)
+            _log_push_error(e)
+
+    # ------------------- Async entry point -------------------
+
+    async def create_daily_doc_async(self, title: str, content_md: str) -> Optional[str]:
+        """
+        Async version of create_daily_doc on a pooled httpx.AsyncClient; callers can create
+        several documents concurrently with asyncio.gather.
+        :param title: document title
+        :param content_md: Markdown content
+        :return: document URL (None on failure or incomplete write)
+        """
+        if not self._ready:
+            logger.error("飞书配置不完整，无法创建文档")
+            return None
+
+        cache_key = _doc_cache_key(title, content_md)
+        cached_url = await asyncio.to_thread(self._get_cached_doc_url, cache_key)
+        if cached_url:
+            logger.info("相同内容的文档已创建，跳过创建与推送：%s", cached_url)
+            return cached_url
+
+        async with self._async_session():
+            try:
+                # Push only after the content is fully written
+                doc_url = await self._arun_steps(self._create_doc_steps(title, content_md))
+                if not doc_url:
+                    return None
+                await asyncio.to_thread(self._cache_doc_url, cache_key, doc_url)
+
+                if self.bot_webhook:
+                    await self._send_doc_link_async(title, doc_url)
+                else:
+                    logger.warning("飞书机器人Webhook未配置，跳过推送")
+
+                return doc_url
+
+            except Exception as e:
+                logger.error("创建/推送文档异常：%s", e, exc_info=True)
+                return None
 
 # ------------------- 测试代码（可选，验证用） -------------------
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
     # 实例化管理器
     doc_manager = FeishuDocManager()
     
@@ -0,0 +1,437 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for src.feishu_doc (offline; HTTP client and config are mocked).
+
+Covers:
+- Descendant grouping and merge_info stripping
+- Local Markdown -> block conversion
+- Bot push body escaping
+- Retry delay calculation
+- Token and created-document cache paths
+- Retry classification of _post
+- Content writing, fallback decisions and create_daily_doc(_async) over httpx.MockTransport
+"""
+
+import asyncio
+import json
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import httpx
+
+import src.feishu_doc as feishu_doc
+
+_WEBHOOK = "https://hooks.test/bot"
+
+
+def _make_manager(webhook: str = None) -> feishu_doc.FeishuDocManager:
+    """Create a manager from a complete fake config."""
+    config = SimpleNamespace(
+        feishu_app_id="app",
+        feishu_app_secret="secret",
+        feishu_folder_token="folder",
+        feishu_bot_webhook=webhook,
+    )
+    with patch.object(feishu_doc, "get_config", return_value=config):
+        return feishu_doc.FeishuDocManager()
+
+
+def _json_response(payload: dict, status_code: int = 200, headers: dict = None) -> MagicMock:
+    """Create a fake httpx response."""
+    response = MagicMock()
+    response.status_code = status_code
+    response.headers = headers or {}
+    response.json.return_value = payload
+    return response
+
+
+def _block(block_id: str, children=None) -> dict:
+    return {"block_id": block_id, "children": children or []}
+
+
+class _FakeFeishu:
+    """
+    httpx.MockTransport handler routing by path suffix.
+    A route's replies are used in order (the last one repeats); a reply is a JSON dict,
+    an httpx.Response, or an exception class raised as if the network failed.
+    """
+
+    def __init__(self, routes: dict) -> None:
+        self.routes = {suffix: list(replies) for suffix, replies in routes.items()}
+        self.requests = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        for suffix, replies in self.routes.items():
+            if request.url.path.endswith(suffix):
+                reply = replies.pop(0) if len(replies) > 1 else replies[0]
+                if isinstance(reply, type) and issubclass(reply, Exception):
+                    raise reply("simulated failure", request=request)
+                return reply if isinstance(reply, httpx.Response) else httpx.Response(200, json=reply)
+        return httpx.Response(404, json={"code": 404, "msg": "no route"})
+
+    def paths(self) -> list:
+        return [request.url.path.rsplit("/", 1)[-1] for request in self.requests]
+
+    def bodies(self, suffix: str) -> list:
+        return [json.loads(r.content) for r in self.requests if r.url.path.endswith(suffix)]
+
+
+_OK = {"code": 0, "data": {}}
+_CREATED = {"code": 0, "data": {"document": {"document_id": "doc1"}}}
+_CONVERTED = {"code": 0, "data": {"first_level_block_ids": ["a"], "blocks": [_block("a")]}}
+_REJECTED = {"code": 1770001, "msg": "invalid param"}
+
+
+class GroupDescendantsTestCase(unittest.TestCase):
+    """Test splitting converted blocks into insert calls."""
+
+    def test_single_group_within_limit(self) -> None:
+        blocks = [_block("a", ["a1"]), _block("a1"), _block("b")]
+        groups = feishu_doc._group_descendants(["a", "b"], blocks, 10)
+        self.assertEqual(groups, [(["a", "b"], blocks)])
+
+    def test_split_on_first_level_blocks(self) -> None:
+        blocks = [_block("a", ["a1"]), _block("a1"), _block("b", ["b1"]), _block("b1"), _block("c")]
+        groups = feishu_doc._group_descendants(["a", "b", "c"], blocks, 3)
+        self.assertEqual([ids for ids, _ in groups], [["a"], ["b", "c"]])
+        self.assertEqual([b["block_id"] for b in groups[0][1]], ["a", "a1"])
+        self.assertEqual([b["block_id"] for b in groups[1][1]], ["b", "b1", "c"])
+
+    def test_oversized_subtree_returns_none(self) -> None:
+        blocks = [_block("a", ["a1", "a2"]), _block("a1"), _block("a2"), _block("b")]
+        self.assertIsNone(feishu_doc._group_descendants(["a", "b"], blocks, 2))
+
+    def test_descendant_groups_strips_merge_info(self) -> None:
+        table = {"block_id": "t", "table": {"property": {"row_size": 1, "merge_info": [{}]}}}
+        data = {"first_level_block_ids": ["t", "n"], "blocks": [table, {"block_id": "n", "table": None}]}
+        groups = feishu_doc._descendant_groups(data)
+        self.assertEqual(len(groups), 1)
+        self.assertEqual(table["table"]["property"], {"row_size": 1})
+
+    def test_descendant_groups_empty_data(self) -> None:
+        self.assertEqual(feishu_doc._descendant_groups({}), [([], [])])
+
+
+class MarkdownBlocksTestCase(unittest.TestCase):
+    """Test the local line-by-line Markdown conversion."""
+
+    def setUp(self) -> None:
+        self.manager = _make_manager()
+
+    def _convert(self, md_text: str) -> list:
+        return list(self.manager._iter_markdown_blocks(md_text))
+
+    def test_headings(self) -> None:
+        blocks = self._convert("# One\n## Two\n### Three\n")
+        self.assertEqual([b["block_type"] for b in blocks], [3, 4, 5])
+        self.assertEqual(blocks[1]["heading2"]["elements"][0]["text_run"]["content"], "Two")
+
+    def test_level_four_heading_is_text(self) -> None:
+        blocks = self._convert("#### Four")
+        self.assertEqual(blocks[0]["block_type"], 2)
+        self.assertEqual(blocks[0]["text"]["elements"][0]["text_run"]["content"], "#### Four")
+
+    def test_divider(self) -> None:
+        blocks = self._convert("---\n----x\n")
+        self.assertEqual(blocks[0], {"block_type": 22, "divider": {}})
+        self.assertEqual(blocks[1]["block_type"], 2)
+
+    def test_blank_lines_skipped(self) -> None:
+        blocks = self._convert("\n  \nline\n\n")
+        self.assertEqual(len(blocks), 1)
+        self.assertEqual(blocks[0]["text"]["elements"][0]["text_run"]["content"], "line")
+
+
+class PushBodyTestCase(unittest.TestCase):
+    """Test the pre-serialized bot push body."""
+
+    def test_special_characters_produce_valid_json(self) -> None:
+        title = 'a "quoted" \\ 100% title'
+        body = json.loads(feishu_doc._build_push_body(title, "https://feishu.cn/docx/x?a=%20"))
+        text = body["content"]["text"]
+        self.assertIn(title, text)
+        self.assertIn("https://feishu.cn/docx/x?a=%20", text)
+        self.assertEqual(body["msg_type"], "markdown")
+
+
+class RetryDelayTestCase(unittest.TestCase):
+    """Test the retry delay calculation."""
+
+    def test_retry_after_header(self) -> None:
+        response = _json_response({}, 429, {"Retry-After": "7"})
+        self.assertEqual(feishu_doc._retry_delay(response, 0), 7.0)
+
+    def test_exponential_backoff(self) -> None:
+        response = _json_response({}, 503)
+        with patch.object(feishu_doc.random, "random", return_value=0.0):
+            self.assertEqual(feishu_doc._retry_delay(response, 0), 1.0)
+            self.assertEqual(feishu_doc._retry_delay(response, 2), 4.0)
+        with patch.object(feishu_doc.random, "random", return_value=1.0):
+            self.assertEqual(feishu_doc._retry_delay(response, 1, base=2.0), 6.0)
+
+    def test_retry_plan_stops_on_success_and_limit(self) -> None:
+        self.assertIsNone(feishu_doc._retry_plan(_json_response({}, 200), 0))
+        self.assertIsNone(feishu_doc._retry_plan(_json_response({}, 500), feishu_doc._MAX_RETRIES))
+        self.assertEqual(feishu_doc._retry_plan(_json_response({}, 429, {"Retry-After": "2"}), 0), 2.0)
+
+    def test_retry_plan_does_not_resend_on_server_error(self) -> None:
+        for status in (500, 502, 503, 504):
+            self.assertIsNone(feishu_doc._retry_plan(_json_response({}, status), 0))
+
+    def test_retry_plan_gives_up_on_long_retry_after(self) -> None:
+        self.assertIsNone(feishu_doc._retry_plan(_json_response({}, 429, {"Retry-After": "3600"}), 0))
+
+
+class CacheTestCase(unittest.TestCase):
+    """Test the token and created-document caches with a mocked HTTP client."""
+
+    def setUp(self) -> None:
+        self._temp_dir = tempfile.TemporaryDirectory()
+        self.data_dir = Path(self._temp_dir.name)
+        patcher = patch.object(feishu_doc, "get_data_dir", return_value=self.data_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self._temp_dir.cleanup)
+        self.manager = _make_manager()
+        self.manager.http_client = MagicMock()
+
+    def _token_response(self, token: str = "t-1") -> MagicMock:
+        return _json_response({"code": 0, "tenant_access_token": token, "expire": 7200})
+
+    def test_token_fetched_once_and_cached(self) -> None:
+        self.manager.http_client.post.return_value = self._token_response()
+        self.assertEqual(self.manager._get_tenant_access_token(), "t-1")
+        self.assertEqual(self.manager._get_tenant_access_token(), "t-1")
+        self.assertEqual(self.manager.http_client.post.call_count, 1)
+
+        cache_file = self.data_dir / feishu_doc._TOKEN_CACHE_FILE
+        self.assertEqual(json.loads(cache_file.read_text())["app"]["token"], "t-1")
+        self.assertEqual(cache_file.stat().st_mode & 0o777, 0o600)
+
+    def test_token_loaded_from_file_cache(self) -> None:
+        self.manager.http_client.post.return_value = self._token_response()
+        self.manager._get_tenant_access_token()
+
+        other = _make_manager()
+        other.http_client = MagicMock()
+        self.assertEqual(other._get_tenant_access_token(), "t-1")
+        other.http_client.post.assert_not_called()
+
+    def test_expired_token_is_refetched(self) -> None:
+        self.manager.http_client.post.side_effect = [self._token_response("t-1"), self._token_response("t-2")]
+        self.manager._get_tenant_access_token()
+        self.manager._token_exp_ts = time.time() - 1
+        feishu_doc._save_json_cache(feishu_doc._TOKEN_CACHE_FILE, {"app": {"token": "t-1", "exp_ts": 0}})
+        self.assertEqual(self.manager._get_tenant_access_token(), "t-2")
+
+    def test_token_failure_raises(self) -> None:
+        self.manager.http_client.post.return_value = _json_response({"code": 10003, "msg": "invalid app"})
+        self.assertIsNone(self.manager._get_tenant_access_token())
+        with self.assertRaises(RuntimeError):
+            self.manager._require_token()
+
+    def test_invalid_token_is_refreshed_once(self) -> None:
+        self.manager.http_client.post.side_effect = [
+            self._token_response("t-1"),
+            _json_response({"code": 99991663, "msg": "invalid token"}),
+            self._token_response("t-2"),
+            _json_response({"code": 0, "data": {}}),
+        ]
+        result = self.manager._post_openapi("/docx/v1/documents", {})
+        self.assertEqual(result["code"], 0)
+        last_headers = self.manager.http_client.post.call_args.kwargs["headers"]
+        self.assertEqual(last_headers["Authorization"], "Bearer t-2")
+
+    def test_doc_url_cache(self) -> None:
+        key = feishu_doc._doc_cache_key("title", "content")
+        self.assertIsNone(self.manager._get_cached_doc_url(key))
+        self.manager._cache_doc_url(key, "https://feishu.cn/docx/1")
+        self.assertEqual(self.manager._get_cached_doc_url(key), "https://feishu.cn/docx/1")
+        self.assertNotEqual(key, feishu_doc._doc_cache_key("title", "other"))
+
+    def test_expired_doc_url_is_pruned(self) -> None:
+        feishu_doc._save_json_cache(feishu_doc._DOC_CACHE_FILE, {"old": {"url": "u", "exp_ts": 0}})
+        self.assertIsNone(self.manager._get_cached_doc_url("old"))
+        self.manager._cache_doc_url("new", "https://feishu.cn/docx/2")
+        cache = json.loads((self.data_dir / feishu_doc._DOC_CACHE_FILE).read_text())
+        self.assertEqual(list(cache), ["new"])
+
+
+class PostRetryTestCase(unittest.TestCase):
+    """Test which responses _post re-sends."""
+
+    def setUp(self) -> None:
+        self.manager = _make_manager()
+        sleep_patcher = patch.object(feishu_doc.time, "sleep")
+        self.sleep = sleep_patcher.start()
+        self.addCleanup(sleep_patcher.stop)
+
+    def _post(self, fake: _FakeFeishu) -> httpx.Response:
+        self.manager.http_client = httpx.Client(transport=httpx.MockTransport(fake))
+        return self.manager._post(_WEBHOOK, json={})
+
+    def test_rate_limit_is_retried(self) -> None:
+        fake = _FakeFeishu({"/bot": [httpx.Response(429, headers={"Retry-After": "1"}), _OK]})
+        self.assertEqual(self._post(fake).status_code, 200)
+        self.assertEqual(len(fake.requests), 2)
+        self.sleep.assert_called_once_with(1.0)
+
+    def test_server_error_is_not_resent(self) -> None:
+        fake = _FakeFeishu({"/bot": [httpx.Response(502, text="Bad Gateway")]})
+        self.assertEqual(self._post(fake).status_code, 502)
+        self.assertEqual(len(fake.requests), 1)
+
+    def test_read_timeout_is_not_resent(self) -> None:
+        fake = _FakeFeishu({"/bot": [httpx.ReadTimeout]})
+        with self.assertRaises(httpx.ReadTimeout):
+            self._post(fake)
+        self.assertEqual(len(fake.requests), 1)
+
+
+class ContentWriteTestCase(unittest.TestCase):
+    """Test the write steps and their fallback decisions over a mocked transport."""
+
+    def setUp(self) -> None:
+        self.manager = _make_manager()
+        self.manager._token, self.manager._token_exp_ts = "t", time.time() + 3600
+
+    def _write(self, routes: dict, content_md: str = "# Title\ntext") -> tuple:
+        fake = _FakeFeishu(routes)
+        self.manager.http_client = httpx.Client(transport=httpx.MockTransport(fake))
+        complete = self.manager._run_steps(self.manager._content_write_steps("doc1", content_md))
+        return complete, fake
+
+    def test_native_write_complete(self) -> None:
+        complete, fake = self._write({"/convert": [_CONVERTED], "/descendant": [_OK]})
+        self.assertTrue(complete)
+        self.assertEqual(fake.paths(), ["convert", "descendant"])
+
+    def test_convert_rejected_falls_back(self) -> None:
+        complete, fake = self._write({"/convert": [_REJECTED], "/children": [_OK]})
+        self.assertTrue(complete)
+        self.assertEqual(fake.paths(), ["convert", "children"])
+        self.assertEqual(len(fake.bodies("/children")[0]["children"]), 2)
+
+    def test_first_insert_rejected_falls_back(self) -> None:
+        complete, fake = self._write({"/convert": [_CONVERTED], "/descendant": [_REJECTED], "/children": [_OK]})
+        self.assertTrue(complete)
+        self.assertEqual(fake.paths(), ["convert", "descendant", "children"])
+
+    def test_first_insert_timeout_does_not_fall_back(self) -> None:
+        complete, fake = self._write({"/convert": [_CONVERTED], "/descendant": [httpx.ReadTimeout], "/children": [_OK]})
+        self.assertFalse(complete)
+        self.assertEqual(fake.paths(), ["convert", "descendant"])
+
+    def test_first_insert_server_error_does_not_fall_back(self) -> None:
+        routes = {"/convert": [_CONVERTED], "/descendant": [httpx.Response(504, text="timeout")], "/children": [_OK]}
+        complete, fake = self._write(routes)
+        self.assertFalse(complete)
+        self.assertEqual(fake.paths(), ["convert", "descendant"])
+
+    def test_later_insert_failure_is_partial(self) -> None:
+        converted = {"code": 0, "data": {
+            "first_level_block_ids": ["a", "b"],
+            "blocks": [_block("a", ["a1"]), _block("a1"), _block("b")],
+        }}
+        routes = {"/convert": [converted], "/descendant": [_OK, _REJECTED], "/children": [_OK]}
+        with patch.object(feishu_doc, "_MAX_DESCENDANTS", 2):
+            complete, fake = self._write(routes)
+        self.assertFalse(complete)
+        self.assertEqual(fake.paths(), ["convert", "descendant", "descendant"])
+
+    def test_group_index_counts_root_children_only(self) -> None:
+        converted = {"code": 0, "data": {
+            "first_level_block_ids": ["a", "b"],
+            "blocks": [_block("a", ["a1"]), _block("a1"), _block("b")],
+        }}
+        # data.children of the descendant API also lists nested blocks
+        inserted = {"code": 0, "data": {"children": [{"block_id": "x"}, {"block_id": "x1"}]}}
+        with patch.object(feishu_doc, "_MAX_DESCENDANTS", 2):
+            complete, fake = self._write({"/convert": [converted], "/descendant": [inserted, _OK]})
+        self.assertTrue(complete)
+        self.assertEqual([body["index"] for body in fake.bodies("/descendant")], [0, 1])
+
+    def test_batch_failure_is_reported(self) -> None:
+        fake = _FakeFeishu({"/children": [_OK, _REJECTED, _OK]})
+        self.manager.http_client = httpx.Client(transport=httpx.MockTransport(fake))
+        blocks = (feishu_doc._make_text_block(2, str(i)) for i in range(120))
+        self.assertFalse(self.manager._run_steps(self.manager._batch_write_steps("doc1", blocks)))
+        self.assertEqual([len(body["children"]) for body in fake.bodies("/children")], [50, 50, 20])
+
+
+class CreateDocTestCase(unittest.TestCase):
+    """Test that only completely written documents are cached and pushed."""
+
+    def setUp(self) -> None:
+        self._temp_dir = tempfile.TemporaryDirectory()
+        self.data_dir = Path(self._temp_dir.name)
+        patcher = patch.object(feishu_doc, "get_data_dir", return_value=self.data_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self._temp_dir.cleanup)
+        self.manager = _make_manager(webhook=_WEBHOOK)
+        self.manager._token, self.manager._token_exp_ts = "t", time.time() + 3600
+
+    def _routes(self, descendant_reply) -> dict:
+        return {
+            "/documents": [_CREATED],
+            "/convert": [_CONVERTED],
+            "/descendant": [descendant_reply],
+            "/bot": [_OK],
+        }
+
+    def _create(self, fake: _FakeFeishu):
+        self.manager.http_client = httpx.Client(transport=httpx.MockTransport(fake))
+        with patch.object(feishu_doc, "_PUSH_POOL") as pool:
+            doc_url = self.manager.create_daily_doc("title", "# Title")
+        return doc_url, pool
+
+    def _create_async(self, fake: _FakeFeishu):
+        with patch.object(feishu_doc.httpx, "AsyncHTTPTransport", return_value=httpx.MockTransport(fake)):
+            return asyncio.run(self.manager.create_daily_doc_async("title", "# Title"))
+
+    def _cached_url(self):
+        return self.manager._get_cached_doc_url(feishu_doc._doc_cache_key("title", "# Title"))
+
+    def test_complete_write_is_cached_and_pushed(self) -> None:
+        doc_url, pool = self._create(_FakeFeishu(self._routes(_OK)))
+        self.assertEqual(doc_url, "https://feishu.cn/docx/doc1")
+        self.assertEqual(self._cached_url(), doc_url)
+        pool.submit.assert_called_once_with(self.manager._send_doc_link_to_feishu, "title", doc_url)
+
+    def test_cached_document_is_not_recreated(self) -> None:
+        self._create(_FakeFeishu(self._routes(_OK)))
+        fake = _FakeFeishu(self._routes(_OK))
+        doc_url, pool = self._create(fake)
+        self.assertEqual(doc_url, "https://feishu.cn/docx/doc1")
+        self.assertEqual(fake.requests, [])
+        pool.submit.assert_not_called()
+
+    def test_partial_write_is_not_cached_or_pushed(self) -> None:
+        doc_url, pool = self._create(_FakeFeishu(self._routes(httpx.ReadTimeout)))
+        self.assertIsNone(doc_url)
+        self.assertIsNone(self._cached_url())
+        pool.submit.assert_not_called()
+
+    def test_async_complete_write_is_cached_and_pushed(self) -> None:
+        fake = _FakeFeishu(self._routes(_OK))
+        doc_url = self._create_async(fake)
+        self.assertEqual(doc_url, "https://feishu.cn/docx/doc1")
+        self.assertEqual(self._cached_url(), doc_url)
+        self.assertEqual(fake.paths(), ["documents", "convert", "descendant", "bot"])
+        self.assertEqual(self.manager._async_clients, {})
+
+    def test_async_partial_write_is_not_cached_or_pushed(self) -> None:
+        fake = _FakeFeishu(self._routes(httpx.ReadTimeout))
+        self.assertIsNone(self._create_async(fake))
+        self.assertIsNone(self._cached_url())
+        self.assertEqual(fake.paths(), ["documents", "convert", "descendant"])
+
+
+if __name__ == "__main__":
+    unittest.main()